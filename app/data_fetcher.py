@@ -2,56 +2,133 @@ from __future__ import annotations
 
 import csv
 import io
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from typing import Dict, Iterable, List, Optional, Tuple
 
 import requests
 from dateutil import parser
-from sqlalchemy import select
+from requests.adapters import HTTPAdapter
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
+from urllib3.util.retry import Retry
 
 from .models import EuroMillionsDraw, LotoDraw
 
 LOTTO_URL = "https://media.fdj.fr/static/csv/loto.csv"
 EUROMILLIONS_URL = "https://media.fdj.fr/static/csv/euromillions.csv"
 
+# Shared session so the two FDJ downloads reuse pooled connections instead of
+# paying a fresh TCP/TLS handshake per request, with retries on transient errors.
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=4,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+    ),
+)
+
 
 class FetchError(RuntimeError):
     """Raised when lottery data cannot be fetched."""
 
 
 def _download_csv(url: str) -> str:
-    response = requests.get(url, timeout=30)
+    response = SESSION.get(url, timeout=(5, 30))
     response.raise_for_status()
     response.encoding = "utf-8"
     return response.text
 
 
+@lru_cache(maxsize=4096)
+def _normalize_header(key: str) -> str:
+    """Trim, lowercase and strip accents from a CSV header.
+
+    The same handful of header strings comes back for every row of the file,
+    so results are cached rather than re-normalized per row.
+    """
+    key = key.strip().lower()
+    if key.isascii():
+        # Quick check: ASCII headers are already in canonical form, so the
+        # NFKD decomposition and combining-mark filter can be skipped.
+        return key
+    normalized = unicodedata.normalize("NFKD", key)
+    return "".join(char for char in normalized if not unicodedata.combining(char))
+
+
+def _detect_delimiter(sample: str) -> str:
+    """Pick the most frequent candidate delimiter in the sample.
+
+    FDJ files use ';', so a simple character vote is enough; csv.Sniffer's
+    regex-based detection is slower and can backtrack badly on odd input.
+    """
+    counts = {delimiter: sample.count(delimiter) for delimiter in (";", ",", "\t")}
+    best = max(counts, key=counts.get)
+    return best if counts[best] else ";"
+
+
 def _prepare_reader(csv_content: str) -> Iterable[Dict[str, str]]:
+    # Rows are yielded lazily so callers stream the file one row at a time;
+    # only a small prefix is examined to detect the dialect.
     handle = io.StringIO(csv_content)
-    sample = handle.read(4096)
-    handle.seek(0)
-    try:
-        dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
-        reader = csv.DictReader(handle, dialect=dialect)
-    except csv.Error:
-        reader = csv.DictReader(handle, delimiter=';')
+    reader = csv.DictReader(handle, delimiter=_detect_delimiter(csv_content[:4096]))
     # Normalize keys once here for easier handling downstream
     for row in reader:
-        yield {key.strip().lower(): value.strip() for key, value in row.items() if key}
+        yield {_normalize_header(key): value.strip() for key, value in row.items() if key}
 
 
-def _extract_numbers(row: Dict[str, str], prefix: str) -> List[int]:
-    extracted: List[Tuple[int, int]] = []
-    for key, value in row.items():
-        if key.startswith(prefix) and value:
+@lru_cache(maxsize=None)
+def _classify_header(key: str) -> Optional[Tuple[str, int]]:
+    """Classify a header as ("boule", n), ("etoile", n) or ("chance", 0).
+
+    Cached so the string work runs once per distinct column for the whole
+    file instead of once per row.
+    """
+    for prefix, category in (("boule_", "boule"), ("etoile_", "etoile")):
+        if key.startswith(prefix):
             try:
-                suffix = int(key.replace(prefix, ""))
-                extracted.append((suffix, int(value)))
+                # Slice off the prefix rather than str.replace, which would
+                # rescan the whole key (and mangle repeated occurrences).
+                return category, int(key[len(prefix):])
             except ValueError:
-                continue
-    extracted.sort(key=lambda item: item[0])
-    return [value for _, value in extracted]
+                return None
+    if key == "numero_chance":
+        return "chance", 0
+    return None
+
+
+def _collect_row_numbers(
+    row: Dict[str, str]
+) -> Tuple[List[int], List[int], Optional[int]]:
+    """Gather main numbers, star numbers and the chance number in one pass."""
+    mains: List[Tuple[int, int]] = []
+    stars: List[Tuple[int, int]] = []
+    chance: Optional[int] = None
+    for key, value in row.items():
+        if not value:
+            continue
+        kind = _classify_header(key)
+        if kind is None:
+            continue
+        category, position = kind
+        if category == "chance":
+            chance = _parse_int(value)
+            continue
+        try:
+            number = int(value)
+        except ValueError:
+            continue
+        if category == "boule":
+            mains.append((position, number))
+        else:
+            stars.append((position, number))
+    mains.sort()
+    stars.sort()
+    return [number for _, number in mains], [number for _, number in stars], chance
 
 
 def _parse_int(value: Optional[str]) -> Optional[int]:
@@ -66,16 +143,34 @@ def _parse_int(value: Optional[str]) -> Optional[int]:
         raise FetchError(f"Valeur numérique invalide: {value}") from exc
 
 
+# Formats seen in FDJ exports, tried before falling back to dateutil's much
+# slower general-purpose parser.
+_DATE_FORMATS = ("%Y%m%d", "%d/%m/%Y", "%Y-%m-%d")
+
+
 def _parse_date(row: Dict[str, str]) -> datetime:
     for key in ("date_de_tirage", "date", "drawdate"):
         if key in row and row[key]:
+            value = row[key]
+            for fmt in _DATE_FORMATS:
+                try:
+                    return datetime.strptime(value, fmt)
+                except ValueError:
+                    continue
             try:
-                return parser.parse(row[key], dayfirst=True)
+                return parser.parse(value, dayfirst=True)
             except (ValueError, parser.ParserError) as exc:  # pragma: no cover
-                raise FetchError(f"Date invalide: {row[key]}") from exc
+                raise FetchError(f"Date invalide: {value}") from exc
     raise FetchError("Champ de date introuvable dans la ligne")
 
 
+def _mask_from_numbers(numbers: Iterable[int]) -> int:
+    mask = 0
+    for number in numbers:
+        mask |= 1 << number
+    return mask
+
+
 def _parse_draw_number(row: Dict[str, str]) -> Optional[int]:
     for key in ("numero_de_tirage", "num_tirage", "drawnumber"):
         if key in row:
@@ -83,93 +178,125 @@ def _parse_draw_number(row: Dict[str, str]) -> Optional[int]:
     return None
 
 
-def update_loto_draws(session: Session) -> int:
-    """Download the latest Loto draws and merge them into the database."""
-    csv_content = _download_csv(LOTTO_URL)
-    reader = _prepare_reader(csv_content)
+def _fetch_loto() -> str:
+    return _download_csv(LOTTO_URL)
 
-    inserted = 0
-    for row in reader:
-        draw_date = _parse_date(row).date()
-        draw_number = _parse_draw_number(row)
-        numbers = _extract_numbers(row, "boule_")
-        chance_number = _parse_int(row.get("numero_chance"))
-        if len(numbers) < 5 or chance_number is None:
-            # Skip malformed entries
-            continue
 
-        numbers = sorted(set(numbers))
-        # Some datasets may include duplicates; ensure exactly 5 numbers
-        if len(numbers) != 5:
-            continue
+def _fetch_euromillions() -> str:
+    return _download_csv(EUROMILLIONS_URL)
 
-        stmt = select(LotoDraw).where(
-            LotoDraw.draw_date == draw_date,
-            LotoDraw.draw_number == draw_number,
-        )
-        existing = session.execute(stmt).scalar_one_or_none()
-        if existing:
-            continue
 
-        draw = LotoDraw(
-            draw_date=draw_date,
-            draw_number=draw_number,
-            main_numbers=",".join(str(num) for num in numbers),
-            chance_number=chance_number,
-        )
-        session.add(draw)
-        inserted += 1
+def _loto_row_kwargs(row: Dict[str, str]) -> Optional[Dict[str, object]]:
+    """Game-specific columns for a Loto row, or None for malformed entries."""
+    numbers, _, chance_number = _collect_row_numbers(row)
+    if len(numbers) < 5 or chance_number is None:
+        return None
 
-    if inserted:
-        session.commit()
-    return inserted
+    numbers = sorted(set(numbers))
+    # Some datasets may include duplicates; ensure exactly 5 numbers
+    if len(numbers) != 5:
+        return None
 
+    return {
+        "main_numbers": ",".join(str(num) for num in numbers),
+        "main_mask": _mask_from_numbers(numbers),
+        "chance_number": chance_number,
+    }
 
-def update_euromillions_draws(session: Session) -> int:
-    """Download the latest EuroMillions draws and merge them into the database."""
-    csv_content = _download_csv(EUROMILLIONS_URL)
-    reader = _prepare_reader(csv_content)
 
-    inserted = 0
-    for row in reader:
+def _euromillions_row_kwargs(row: Dict[str, str]) -> Optional[Dict[str, object]]:
+    """Game-specific columns for a EuroMillions row, or None for malformed entries."""
+    numbers, stars, _ = _collect_row_numbers(row)
+    if len(numbers) < 5 or len(stars) < 2:
+        return None
+
+    numbers = sorted(set(numbers))
+    stars = sorted(set(stars))
+    if len(numbers) != 5 or len(stars) != 2:
+        return None
+
+    return {
+        "main_numbers": ",".join(str(num) for num in numbers),
+        "main_mask": _mask_from_numbers(numbers),
+        "star_numbers": ",".join(str(num) for num in stars),
+    }
+
+
+def _update_draws(session: Session, model, rows, row_to_kwargs) -> int:
+    """Shared ingest pipeline: dedup against one prefetched key set, bulk insert.
+
+    One scan instead of one SELECT per CSV row: almost every row already
+    exists, so membership in the key set decides whether to insert.
+    """
+    existing = {
+        (draw_date, draw_number)
+        for draw_date, draw_number in session.execute(
+            select(model.draw_date, model.draw_number)
+        )
+    }
+
+    pending: List[Dict[str, object]] = []
+    for row in rows:
+        kwargs = row_to_kwargs(row)
+        if kwargs is None:
+            continue
+
         draw_date = _parse_date(row).date()
         draw_number = _parse_draw_number(row)
-        numbers = _extract_numbers(row, "boule_")
-        stars = _extract_numbers(row, "etoile_")
-        if len(numbers) < 5 or len(stars) < 2:
+        if (draw_date, draw_number) in existing:
             continue
+        existing.add((draw_date, draw_number))
 
-        numbers = sorted(set(numbers))
-        stars = sorted(set(stars))
-        if len(numbers) != 5 or len(stars) != 2:
-            continue
+        kwargs["draw_date"] = draw_date
+        kwargs["draw_number"] = draw_number
+        pending.append(kwargs)
 
-        stmt = select(EuroMillionsDraw).where(
-            EuroMillionsDraw.draw_date == draw_date,
-            EuroMillionsDraw.draw_number == draw_number,
-        )
-        existing = session.execute(stmt).scalar_one_or_none()
-        if existing:
-            continue
+    if pending:
+        session.execute(insert(model), pending)
+    return len(pending)
 
-        draw = EuroMillionsDraw(
-            draw_date=draw_date,
-            draw_number=draw_number,
-            main_numbers=",".join(str(num) for num in numbers),
-            star_numbers=",".join(str(num) for num in stars),
-        )
-        session.add(draw)
-        inserted += 1
 
-    if inserted:
-        session.commit()
-    return inserted
+def _ingest_loto(session: Session, csv_content: str) -> int:
+    return _update_draws(session, LotoDraw, _prepare_reader(csv_content), _loto_row_kwargs)
+
+
+def _ingest_euromillions(session: Session, csv_content: str) -> int:
+    return _update_draws(
+        session, EuroMillionsDraw, _prepare_reader(csv_content), _euromillions_row_kwargs
+    )
+
+
+def update_loto_draws(session: Session) -> int:
+    """Download and stage the latest Loto draws; committing is up to the caller."""
+    return _ingest_loto(session, _fetch_loto())
+
+
+def update_euromillions_draws(session: Session) -> int:
+    """Download and stage the latest EuroMillions draws; committing is up to the caller."""
+    return _ingest_euromillions(session, _fetch_euromillions())
 
 
 def update_all_draws(session: Session) -> Dict[str, int]:
-    """Update both Loto and EuroMillions draws, returning inserted counts."""
-    results = {
-        "loto": update_loto_draws(session),
-        "euromillions": update_euromillions_draws(session),
-    }
+    """Update both Loto and EuroMillions draws, returning inserted counts.
+
+    Both ingests share one transaction, so a full update costs a single
+    commit (and fsync) and either game failing rolls back the whole batch.
+    """
+    # Fetch both files concurrently (network-bound), but keep the database
+    # writes on the caller thread: SQLAlchemy sessions are not thread-safe.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        loto_future = executor.submit(_fetch_loto)
+        euromillions_future = executor.submit(_fetch_euromillions)
+        loto_content = loto_future.result()
+        euromillions_content = euromillions_future.result()
+
+    try:
+        results = {
+            "loto": _ingest_loto(session, loto_content),
+            "euromillions": _ingest_euromillions(session, euromillions_content),
+        }
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
     return results
@@ -4,7 +4,7 @@ from contextlib import contextmanager
 from pathlib import Path
 from typing import Iterator
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import Session, declarative_base, scoped_session, sessionmaker
 
 DATA_DIR = Path("data")
@@ -18,6 +18,22 @@ ENGINE = create_engine(
     future=True,
 )
 
+@event.listens_for(ENGINE, "connect")
+def _configure_sqlite(dbapi_connection, connection_record) -> None:
+    """Tune SQLite for this read-heavy, write-light workload.
+
+    WAL lets readers proceed while an update commits, and synchronous=NORMAL
+    halves the fsyncs per commit (safe in WAL mode).
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-20000")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
+
 SessionLocal = scoped_session(sessionmaker(bind=ENGINE, expire_on_commit=False))
 
 Base = declarative_base()
@@ -29,6 +45,19 @@ def init_db() -> None:
 
     Base.metadata.create_all(bind=ENGINE)
 
+    # Lightweight migration for databases created before main_mask existed;
+    # legacy rows keep mask 0 and are handled by the string fallback.
+    with ENGINE.begin() as connection:
+        for table in ("loto_draws", "euromillions_draws"):
+            columns = {
+                row[1]
+                for row in connection.exec_driver_sql(f"PRAGMA table_info('{table}')")
+            }
+            if "main_mask" not in columns:
+                connection.exec_driver_sql(
+                    f"ALTER TABLE {table} ADD COLUMN main_mask BIGINT NOT NULL DEFAULT 0"
+                )
+
 
 @contextmanager
 def session_scope() -> Iterator[Session]:
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 from datetime import date, datetime
+from functools import cached_property
 from typing import List
 
-from sqlalchemy import Date, DateTime, Integer, String, UniqueConstraint
+from sqlalchemy import BigInteger, Date, DateTime, Index, Integer, String, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .database import Base
@@ -18,6 +19,9 @@ class TimestampMixin:
         default=datetime.utcnow,
         onupdate=datetime.utcnow,
         nullable=False,
+        # The homepage and history pages read max(updated_at) on every render;
+        # the index turns that full-table scan into a single probe.
+        index=True,
     )
 
 
@@ -29,8 +33,12 @@ class LotoDraw(TimestampMixin, Base):
     draw_date: Mapped[date] = mapped_column(Date, index=True, nullable=False)
     draw_number: Mapped[int | None] = mapped_column(Integer, nullable=True)
     main_numbers: Mapped[str] = mapped_column(String(64), nullable=False)
+    # Bitmask of main_numbers (bit n set iff number n was drawn); fits any
+    # draw in 8 bytes and avoids string parsing on the prediction path.
+    main_mask: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
     chance_number: Mapped[int] = mapped_column(Integer, nullable=False)
 
+    @cached_property
     def numbers_list(self) -> List[int]:
         return [int(value) for value in self.main_numbers.split(",") if value]
 
@@ -45,10 +53,23 @@ class EuroMillionsDraw(TimestampMixin, Base):
     draw_date: Mapped[date] = mapped_column(Date, index=True, nullable=False)
     draw_number: Mapped[int | None] = mapped_column(Integer, nullable=True)
     main_numbers: Mapped[str] = mapped_column(String(64), nullable=False)
+    main_mask: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
     star_numbers: Mapped[str] = mapped_column(String(32), nullable=False)
 
+    @cached_property
     def numbers_list(self) -> List[int]:
         return [int(value) for value in self.main_numbers.split(",") if value]
 
+    @cached_property
     def star_numbers_list(self) -> List[int]:
         return [int(value) for value in self.star_numbers.split(",") if value]
+
+
+# Descending composite indexes matching both the dedup lookup and the
+# "latest draws" ordering, so those queries scan the index without sorting.
+Index("ix_loto_date_num_desc", LotoDraw.draw_date.desc(), LotoDraw.draw_number.desc())
+Index(
+    "ix_euromillions_date_num_desc",
+    EuroMillionsDraw.draw_date.desc(),
+    EuroMillionsDraw.draw_number.desc(),
+)
@@ -1,11 +1,11 @@
 from __future__ import annotations
 
-import random
-from collections import Counter
 from dataclasses import dataclass
-from typing import Iterable, List, Sequence
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
 
-from sqlalchemy import select
+import numpy as np
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
 from .models import EuroMillionsDraw, LotoDraw
@@ -18,40 +18,75 @@ class Prediction:
     extra_numbers: List[int]
 
 
-def _counter_from_draws(draws: Iterable[Sequence[int]]) -> Counter:
-    counter: Counter = Counter()
-    for draw in draws:
-        counter.update(draw)
-    return counter
+_RNG = np.random.default_rng()
 
+# Draws change at most a few times a week, so results are cached per game and
+# keyed by max(updated_at): any insert through /update invalidates naturally.
+_PREDICTION_CACHE: Dict[str, Tuple[Optional[datetime], List[Prediction]]] = {}
 
-def _select_top_numbers(counter: Counter, total_numbers: int, picks: int) -> List[int]:
-    ordered = [number for number, _ in counter.most_common()]
-    remaining = [number for number in range(1, total_numbers + 1) if number not in ordered]
-    combined = ordered + remaining
-    return sorted(combined[:picks])
+
+def _number_matrix(values: Sequence[str]) -> np.ndarray:
+    """Parse comma-separated number strings into one 2D array in a single shot."""
+    return np.array([value.split(",") for value in values], dtype=np.int8)
+
+
+def _main_number_bits(
+    masks: Sequence[int], strings: Sequence[str], total_numbers: int
+) -> np.ndarray:
+    """Per-draw 0/1 matrix indexed by number, decoded from the bitmask column.
+
+    Rows ingested before the mask column existed carry mask 0 and fall back
+    to parsing the comma-separated string representation.
+    """
+    if all(masks):
+        mask_array = np.array(masks, dtype=np.uint64)
+        numbers = np.arange(total_numbers + 1, dtype=np.uint64)
+        return ((mask_array[:, None] >> numbers) & 1).astype(np.int8)
+    matrix = _number_matrix(strings)
+    bits = np.zeros((matrix.shape[0], total_numbers + 1), dtype=np.int8)
+    bits[np.arange(matrix.shape[0])[:, None], matrix] = 1
+    return bits
+
+
+def _count_numbers(drawn: np.ndarray, total_numbers: int) -> np.ndarray:
+    """Histogram of drawn numbers, indexed by number (index 0 unused)."""
+    return np.bincount(drawn.ravel(), minlength=total_numbers + 1)
+
+
+def _select_top_numbers(counts: np.ndarray, picks: int) -> List[int]:
+    # Sort numbers by descending count; the stable sort on the negated counts
+    # breaks ties toward smaller numbers and naturally backfills never-drawn
+    # numbers at the end.
+    ordered = np.argsort(-counts[1:], kind="stable") + 1
+    return sorted(int(number) for number in ordered[:picks])
 
 
 
 def _select_avoiding_recent(recent_draw: Sequence[int], total_numbers: int, picks: int) -> List[int]:
-    pool = [number for number in range(1, total_numbers + 1) if number not in recent_draw]
-    if len(pool) < picks:
-        pool = list(range(1, total_numbers + 1))
-    chosen = random.sample(pool, k=picks)
-    chosen.sort()
-    return chosen
+    pool = np.setdiff1d(np.arange(1, total_numbers + 1), np.asarray(recent_draw))
+    if pool.size < picks:
+        pool = np.arange(1, total_numbers + 1)
+    return sorted(_RNG.choice(pool, size=picks, replace=False).tolist())
 
 
 def generate_loto_predictions(session: Session) -> List[Prediction]:
-    draws = session.execute(select(LotoDraw).order_by(LotoDraw.draw_date.desc())).scalars().all()
-    if not draws:
+    cache_key = session.scalar(select(func.max(LotoDraw.updated_at)))
+    cached = _PREDICTION_CACHE.get("loto")
+    if cached is not None and cached[0] == cache_key:
+        return cached[1]
+
+    rows = session.execute(
+        select(LotoDraw.main_mask, LotoDraw.main_numbers, LotoDraw.chance_number).order_by(
+            LotoDraw.draw_date.desc()
+        )
+    ).all()
+    if not rows:
         return []
 
-    main_draws = [draw.numbers_list() for draw in draws]
-    chance_numbers = [draw.chance_number for draw in draws]
-
-    overall_counter = _counter_from_draws(main_draws)
-    chance_counter = Counter(chance_numbers)
+    main_bits = _main_number_bits(
+        [mask for mask, _, _ in rows], [main_numbers for _, main_numbers, _ in rows], 49
+    )
+    chance_numbers = np.array([chance for _, _, chance in rows], dtype=np.int8)
 
     predictions = []
 
@@ -59,83 +94,79 @@ def generate_loto_predictions(session: Session) -> List[Prediction]:
     predictions.append(
         Prediction(
             method="Fréquence historique",
-            main_numbers=_select_top_numbers(overall_counter, 49, 5),
-            extra_numbers=_select_top_numbers(chance_counter, 10, 1),
+            main_numbers=_select_top_numbers(main_bits.sum(axis=0), 5),
+            extra_numbers=_select_top_numbers(_count_numbers(chance_numbers, 10), 1),
         )
     )
 
     # Method 2: Recent trend (last 30 draws)
-    recent_draws = main_draws[:30]
-    recent_chance = chance_numbers[:30]
-    recent_counter = _counter_from_draws(recent_draws)
-    recent_chance_counter = Counter(recent_chance)
     predictions.append(
         Prediction(
             method="Tendance récente",
-            main_numbers=_select_top_numbers(recent_counter, 49, 5),
-            extra_numbers=_select_top_numbers(recent_chance_counter, 10, 1),
+            main_numbers=_select_top_numbers(main_bits[:30].sum(axis=0), 5),
+            extra_numbers=_select_top_numbers(_count_numbers(chance_numbers[:30], 10), 1),
         )
     )
 
     # Method 3: Avoid last draw
-    last_draw = main_draws[0]
-    last_chance = chance_numbers[0]
     predictions.append(
         Prediction(
             method="Évitement du dernier tirage",
-            main_numbers=_select_avoiding_recent(last_draw, 49, 5),
-            extra_numbers=_select_avoiding_recent([last_chance], 10, 1),
+            main_numbers=_select_avoiding_recent(np.flatnonzero(main_bits[0]).tolist(), 49, 5),
+            extra_numbers=_select_avoiding_recent([int(chance_numbers[0])], 10, 1),
         )
     )
 
+    _PREDICTION_CACHE["loto"] = (cache_key, predictions)
     return predictions
 
 
 def generate_euromillions_predictions(session: Session) -> List[Prediction]:
-    draws = (
-        session.execute(select(EuroMillionsDraw).order_by(EuroMillionsDraw.draw_date.desc()))
-        .scalars()
-        .all()
-    )
-    if not draws:
+    cache_key = session.scalar(select(func.max(EuroMillionsDraw.updated_at)))
+    cached = _PREDICTION_CACHE.get("euromillions")
+    if cached is not None and cached[0] == cache_key:
+        return cached[1]
+
+    rows = session.execute(
+        select(
+            EuroMillionsDraw.main_mask,
+            EuroMillionsDraw.main_numbers,
+            EuroMillionsDraw.star_numbers,
+        ).order_by(EuroMillionsDraw.draw_date.desc())
+    ).all()
+    if not rows:
         return []
 
-    main_draws = [draw.numbers_list() for draw in draws]
-    star_draws = [draw.star_numbers_list() for draw in draws]
-
-    overall_counter = _counter_from_draws(main_draws)
-    star_counter = _counter_from_draws(star_draws)
+    main_bits = _main_number_bits(
+        [mask for mask, _, _ in rows], [main_numbers for _, main_numbers, _ in rows], 50
+    )
+    star_draws = _number_matrix([star_numbers for _, _, star_numbers in rows])
 
     predictions = []
 
     predictions.append(
         Prediction(
             method="Fréquence historique",
-            main_numbers=_select_top_numbers(overall_counter, 50, 5),
-            extra_numbers=_select_top_numbers(star_counter, 12, 2),
+            main_numbers=_select_top_numbers(main_bits.sum(axis=0), 5),
+            extra_numbers=_select_top_numbers(_count_numbers(star_draws, 12), 2),
         )
     )
 
-    recent_draws = main_draws[:30]
-    recent_stars = star_draws[:30]
-    recent_counter = _counter_from_draws(recent_draws)
-    recent_star_counter = _counter_from_draws(recent_stars)
     predictions.append(
         Prediction(
             method="Tendance récente",
-            main_numbers=_select_top_numbers(recent_counter, 50, 5),
-            extra_numbers=_select_top_numbers(recent_star_counter, 12, 2),
+            main_numbers=_select_top_numbers(main_bits[:30].sum(axis=0), 5),
+            extra_numbers=_select_top_numbers(_count_numbers(star_draws[:30], 12), 2),
         )
     )
 
-    last_draw = main_draws[0]
-    last_star_draw = star_draws[0]
     predictions.append(
         Prediction(
             method="Évitement du dernier tirage",
-            main_numbers=_select_avoiding_recent(last_draw, 50, 5),
-            extra_numbers=_select_avoiding_recent(last_star_draw, 12, 2),
+            main_numbers=_select_avoiding_recent(np.flatnonzero(main_bits[0]).tolist(), 50, 5),
+            extra_numbers=_select_avoiding_recent(star_draws[0].tolist(), 12, 2),
         )
     )
 
+    _PREDICTION_CACHE["euromillions"] = (cache_key, predictions)
     return predictions
@@ -40,14 +40,21 @@ def index():
         loto_predictions = generate_loto_predictions(session)
         euromillions_predictions = generate_euromillions_predictions(session)
 
+        # One aggregate query per table instead of separate count/max roundtrips
+        loto_count, loto_updated = session.query(
+            func.count(LotoDraw.id), func.max(LotoDraw.updated_at)
+        ).one()
+        euromillions_count, euromillions_updated = session.query(
+            func.count(EuroMillionsDraw.id), func.max(EuroMillionsDraw.updated_at)
+        ).one()
+
         counts = {
-            "loto": session.query(func.count(LotoDraw.id)).scalar() or 0,
-            "euromillions": session.query(func.count(EuroMillionsDraw.id)).scalar() or 0,
+            "loto": loto_count or 0,
+            "euromillions": euromillions_count or 0,
         }
-        last_update = max(filter(None, [
-            session.query(func.max(LotoDraw.updated_at)).scalar(),
-            session.query(func.max(EuroMillionsDraw.updated_at)).scalar(),
-        ]), default=None)
+        last_update = max(
+            filter(None, [loto_updated, euromillions_updated]), default=None
+        )
     finally:
         session.close()
 